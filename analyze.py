@@ -4,6 +4,10 @@ Surge Download Log Analyzer - Verbose Optimization Edition
 Parses debug.log and provides detailed performance insights.
 """
 
+import contextlib
+import heapq
+import io
+import mmap
 import os
 import re
 import sys
@@ -12,13 +16,10 @@ from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Optional
 
-try:
-    import matplotlib.pyplot as plt
-    import matplotlib.dates as mdates
-    HAS_MATPLOTLIB = True
-except ImportError:
-    HAS_MATPLOTLIB = False
-    print("⚠️  matplotlib not installed. Speed graph will be skipped.")
+# matplotlib/numpy are imported on first use by _load_plotting(), so
+# text-only (--no-graph) runs never pay for them
+plt = mdates = np = None
+HAS_MATPLOTLIB: Optional[bool] = None
 
 # ==============================================================================
 # CONFIGURATION
@@ -27,15 +28,48 @@ SLOW_TASK_THRESHOLD_MULTIPLIER = 2.0  # Tasks > 2x avg are flagged as slow
 GAP_WARNING_THRESHOLD_MS = 500        # Warn if gap between tasks > 500ms
 SPEED_VARIANCE_WARN_RATIO = 3.0       # Warn if slowest worker is 3x slower than fastest
 TOP_N_SLOW_TASKS = 3                  # Show top N slowest tasks per worker
+GRAPH_MAX_POINTS = 5000               # Bin scatter points above this many tasks
+GRAPH_TIME_BUCKETS = 1000             # Number of time buckets when binning
 
 MB = 1024 * 1024
 GB = 1024 * 1024 * 1024
 
 
+# ==============================================================================
+# LOG PATTERNS
+# ==============================================================================
+_TIMESTAMP_RE = re.compile(rb"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]")
+
+# Line patterns are bytes: they run directly over the mmap'd log.
+# All event types share one alternation so each line costs a single search;
+# dispatch on match.lastgroup.
+_EVENT_RE = re.compile(
+    rb"(?P<task>Worker (?P<task_wid>\d+): Task offset=(?P<offset>\d+) length=(?P<length>\d+) took (?P<took>\S+))"
+    rb"|(?P<event>Worker (?P<event_wid>\d+) (?P<event_kind>started|finished))"
+    rb"|(?P<split>Balancer: split largest task \(total splits: (?P<splits>\d+)\))"
+    rb"|(?P<dl>Download .+ completed in (?P<dl_duration>\S+) \((?P<dl_speed>[^)]+)\))"
+    rb"|(?P<probe>Probe complete - filename: (?P<filename>.+), size: (?P<size>\d+))"
+    rb"|(?P<health>Health: Worker (?P<health_wid>\d+) (?P<reason>stalled|slow))"
+)
+
+# Go-style duration value-unit pairs. re.ASCII keeps \d to [0-9]; the
+# literal µ unit is unaffected by the flag.
+_DURATION_RE = re.compile(r'(\d+\.?\d*)(ns|µs|us|ms|s|m|h)', re.ASCII)
+_UNIT_MULT = {
+    'h': 3600.0,
+    'm': 60.0,
+    's': 1.0,
+    'ms': 1e-3,
+    'µs': 1e-6,
+    'us': 1e-6,
+    'ns': 1e-9,
+}
+
+
 # ==============================================================================
 # DATA CLASSES
 # ==============================================================================
-@dataclass
+@dataclass(slots=True)
 class Task:
     """Represents a single completed download task."""
     timestamp: datetime      # When the task FINISHED (log timestamp)
@@ -56,21 +90,22 @@ class Task:
         return (self.length / MB) / self.duration_seconds
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkerStats:
     """Aggregated stats for a single worker."""
     worker_id: int
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     tasks: list = field(default_factory=list)
+    # Running totals, kept in sync by add_task()
+    total_work_time: float = 0.0
+    total_bytes: int = 0
     
-    @property
-    def total_work_time(self) -> float:
-        return sum(t.duration_seconds for t in self.tasks)
-    
-    @property
-    def total_bytes(self) -> int:
-        return sum(t.length for t in self.tasks)
+    def add_task(self, task: Task):
+        """Record a completed task and update the running totals."""
+        self.tasks.append(task)
+        self.total_work_time += task.duration_seconds
+        self.total_bytes += task.length
     
     @property
     def avg_speed_mbps(self) -> float:
@@ -107,36 +142,18 @@ def parse_duration(duration_str: str) -> float:
     Supports: h, m, s, ms, µs/us, ns
     Examples: "1m30s", "500ms", "2.5s", "1h2m3.5s"
     """
-    duration_str = duration_str.strip()
-    total_seconds = 0.0
-    
-    # Regex to find all value-unit pairs
-    pattern = re.compile(r'(\d+\.?\d*)(ns|µs|us|ms|s|m|h)')
-    matches = pattern.findall(duration_str)
+    # findall skips surrounding whitespace on its own, so only the fallback
+    # path needs a stripped copy
+    matches = _DURATION_RE.findall(duration_str)
     
     if not matches:
         # Try parsing as just a number (assume seconds)
         try:
-            return float(duration_str.rstrip('s'))
+            return float(duration_str.strip().rstrip('s'))
         except ValueError:
             return 0.0
     
-    for value, unit in matches:
-        val = float(value)
-        if unit == 'h':
-            total_seconds += val * 3600
-        elif unit == 'm':
-            total_seconds += val * 60
-        elif unit == 's':
-            total_seconds += val
-        elif unit == 'ms':
-            total_seconds += val / 1000
-        elif unit in ('µs', 'us'):
-            total_seconds += val / 1_000_000
-        elif unit == 'ns':
-            total_seconds += val / 1_000_000_000
-    
-    return total_seconds
+    return sum(float(value) * _UNIT_MULT[unit] for value, unit in matches)
 
 
 # ==============================================================================
@@ -145,106 +162,120 @@ def parse_duration(duration_str: str) -> float:
 def parse_log_file(filename: str) -> dict:
     """Parse the debug.log file and extract all relevant data."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        f = open(filename, 'rb')
     except FileNotFoundError:
         print(f"❌ Error: File '{filename}' not found.")
         sys.exit(1)
     
-    # Compiled regex patterns
-    timestamp_re = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]")
-    worker_task_re = re.compile(r"Worker (\d+): Task offset=(\d+) length=(\d+) took (\S+)")
-    worker_event_re = re.compile(r"Worker (\d+) (started|finished)")
-    dl_complete_re = re.compile(r"Download .+ completed in (\S+) \(([^)]+)\)")
-    probe_complete_re = re.compile(r"Probe complete - filename: (.+), size: (\d+)")
-    balancer_split_re = re.compile(r"Balancer: split largest task \(total splits: (\d+)\)")
-    health_kill_re = re.compile(r"Health: Worker (\d+) (stalled|slow)")
-    
     # Data structures
     workers: dict[int, WorkerStats] = {}
     balancer_splits: list[tuple[datetime, int]] = []
     health_kills: list[tuple[datetime, int, str]] = []  # (timestamp, worker_id, reason)
     download_info = {}
     current_time: Optional[datetime] = None
-    
-    for line in lines:
-        line = line.strip()
-        
-        # Extract timestamp
-        ts_match = timestamp_re.match(line)
-        if ts_match:
-            try:
-                current_time = datetime.strptime(ts_match.group(1), "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                pass
-        
-        if not current_time:
-            continue
-        
-        # Worker started/finished
-        event_match = worker_event_re.search(line)
-        if event_match:
-            wid = int(event_match.group(1))
-            event = event_match.group(2)
-            
-            if wid not in workers:
-                workers[wid] = WorkerStats(worker_id=wid)
-            
-            if event == "started":
-                workers[wid].start_time = current_time
-            elif event == "finished":
-                workers[wid].end_time = current_time
-            continue
-        
-        # Task completed
-        task_match = worker_task_re.search(line)
-        if task_match:
-            wid = int(task_match.group(1))
-            offset = int(task_match.group(2))
-            length = int(task_match.group(3))
-            duration = parse_duration(task_match.group(4))
-            
-            if wid not in workers:
-                workers[wid] = WorkerStats(worker_id=wid)
-            
-            task = Task(
-                timestamp=current_time,
-                offset=offset,
-                length=length,
-                duration_seconds=duration
-            )
-            workers[wid].tasks.append(task)
-            continue
-        
-        # Balancer splits
-        split_match = balancer_split_re.search(line)
-        if split_match:
-            total = int(split_match.group(1))
-            balancer_splits.append((current_time, total))
-            continue
-        
-        # Download completed
-        dl_match = dl_complete_re.search(line)
-        if dl_match:
-            download_info['total_duration'] = parse_duration(dl_match.group(1))
-            download_info['avg_speed'] = dl_match.group(2)
-            download_info['end_time'] = current_time
-            continue
-        
-        # Probe info
-        probe_match = probe_complete_re.search(line)
-        if probe_match:
-            download_info['filename'] = probe_match.group(1)
-            download_info['size'] = int(probe_match.group(2))
-            continue
-        
-        # Health check kills
-        health_match = health_kill_re.search(line)
-        if health_match:
-            wid = int(health_match.group(1))
-            reason = health_match.group(2)
-            health_kills.append((current_time, wid, reason))
-            continue
+    last_ts: Optional[bytes] = None
+    
+    # Map the file and run the byte patterns directly over each line's span
+    # (pos/endpos), so no per-line object is allocated and only the captured
+    # groups that are actually used get decoded.
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            pos = 0
+            while pos < size:
+                start = pos
+                end = mm.find(b"\n", start)
+                if end < 0:
+                    end = size
+                pos = end + 1
+                
+                # Every log line starts with "[timestamp]"; a single byte test
+                # rejects blank lines and continuations before any regex runs
+                if mm[start] != 0x5B:  # '['
+                    continue
+                
+                # Extract timestamp
+                ts_match = _TIMESTAMP_RE.match(mm, start, end)
+                if ts_match:
+                    ts = ts_match.group(1)
+                    # Many lines share the same second; only rebuild on change.
+                    # Fixed-width slicing is much cheaper than strptime.
+                    if ts != last_ts:
+                        try:
+                            current_time = datetime(
+                                int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                                int(ts[11:13]), int(ts[14:16]), int(ts[17:19])
+                            )
+                            last_ts = ts
+                        except ValueError:
+                            pass
+                
+                if not current_time:
+                    continue
+                
+                match = _EVENT_RE.search(mm, start, end)
+                if not match:
+                    continue
+                kind = match.lastgroup
+                
+                # Task completed
+                if kind == 'task':
+                    wid = int(match.group('task_wid'))
+                    offset = int(match.group('offset'))
+                    length = int(match.group('length'))
+                    duration = parse_duration(match.group('took').decode())
+                    
+                    w = workers.get(wid)
+                    if w is None:
+                        w = workers[wid] = WorkerStats(worker_id=wid)
+                    
+                    task = Task(
+                        timestamp=current_time,
+                        offset=offset,
+                        length=length,
+                        duration_seconds=duration
+                    )
+                    w.add_task(task)
+                
+                # Worker started/finished
+                elif kind == 'event':
+                    wid = int(match.group('event_wid'))
+                    event = match.group('event_kind')
+                    
+                    w = workers.get(wid)
+                    if w is None:
+                        w = workers[wid] = WorkerStats(worker_id=wid)
+                    
+                    if event == b"started":
+                        w.start_time = current_time
+                    elif event == b"finished":
+                        w.end_time = current_time
+                
+                # Balancer splits
+                elif kind == 'split':
+                    total = int(match.group('splits'))
+                    balancer_splits.append((current_time, total))
+                
+                # Download completed
+                elif kind == 'dl':
+                    download_info['total_duration'] = parse_duration(match.group('dl_duration').decode())
+                    download_info['avg_speed'] = match.group('dl_speed').decode()
+                    download_info['end_time'] = current_time
+                
+                # Probe info
+                elif kind == 'probe':
+                    download_info['filename'] = match.group('filename').decode()
+                    download_info['size'] = int(match.group('size'))
+                
+                # Health check kills
+                elif kind == 'health':
+                    wid = int(match.group('health_wid'))
+                    reason = match.group('reason').decode()
+                    health_kills.append((current_time, wid, reason))
+        finally:
+            if size:
+                mm.close()
     
     return {
         'workers': workers,
@@ -257,12 +288,43 @@ def parse_log_file(filename: str) -> dict:
 # ==============================================================================
 # GRAPHING
 # ==============================================================================
+def _load_plotting() -> bool:
+    """Import the plotting stack once; return whether it is available."""
+    global plt, mdates, np, HAS_MATPLOTLIB
+    if HAS_MATPLOTLIB is None:
+        try:
+            import matplotlib.pyplot as plt
+            import matplotlib.dates as mdates
+            import numpy as np  # always installed alongside matplotlib
+            HAS_MATPLOTLIB = True
+        except ImportError:
+            HAS_MATPLOTLIB = False
+            print("⚠️  matplotlib not installed. Speed graph will be skipped.")
+    return HAS_MATPLOTLIB
+
+
+def _rolling_mean(speeds, window: int):
+    """Mean of the trailing `window` speeds (fewer at the start) at each index."""
+    csum = np.concatenate(([0.0], np.cumsum(speeds)))
+    idx = np.arange(1, len(speeds) + 1)
+    start = np.maximum(0, idx - window)
+    return (csum[idx] - csum[start]) / (idx - start)
+
+
+def _bucket_means(bucket_idx, columns: list, n_buckets: int) -> list:
+    """Average each column within the time buckets that hold any points."""
+    counts = np.bincount(bucket_idx, minlength=n_buckets)
+    used = counts > 0
+    return [np.bincount(bucket_idx, weights=col, minlength=n_buckets)[used] / counts[used]
+            for col in columns]
+
+
 def generate_speed_graph(workers: dict, output_file: str = "speed_graph.png"):
     """
     Generate a graph of download speeds over time.
     Shows individual task speeds as scatter points and a rolling average line.
     """
-    if not HAS_MATPLOTLIB:
+    if not _load_plotting():
         print("\n⚠️  Skipping graph generation (matplotlib not available).")
         return
     
@@ -293,11 +355,8 @@ def generate_speed_graph(workers: dict, output_file: str = "speed_graph.png"):
     
     # Calculate rolling average (window of 10 tasks or 20% of total, whichever is smaller)
     window_size = min(10, max(3, len(speeds) // 5))
-    rolling_avg = []
-    for i in range(len(speeds)):
-        start_idx = max(0, i - window_size + 1)
-        window = speeds[start_idx:i + 1]
-        rolling_avg.append(sum(window) / len(window))
+    speeds_arr = np.asarray(speeds, dtype=np.float64)
+    rolling_avg = _rolling_mean(speeds_arr, window_size)
     
     # Create figure with professional styling
     fig, ax = plt.subplots(figsize=(12, 6), dpi=100)
@@ -306,21 +365,40 @@ def generate_speed_graph(workers: dict, output_file: str = "speed_graph.png"):
     
     # Color map for workers
     unique_workers = sorted(set(worker_ids))
-    colors = plt.cm.viridis([i / max(1, len(unique_workers) - 1) for i in range(len(unique_workers))])
+    colors = plt.cm.viridis(np.linspace(0, 1, len(unique_workers)))
     color_map = {wid: colors[i] for i, wid in enumerate(unique_workers)}
     
+    # Column arrays so each worker's points are selected with a boolean mask
+    times_arr = np.array(times)
+    wid_arr = np.array(worker_ids)
+    sizes_arr = np.array(sizes)
+    
+    # Size points by data size (normalized)
+    point_sizes_arr = 30 + (sizes_arr / sizes_arr.max()) * 100
+    
+    # On very long downloads, average each worker's points into fixed time
+    # buckets so matplotlib renders O(buckets) markers instead of O(tasks)
+    binned = len(times) > GRAPH_MAX_POINTS
+    if binned:
+        times_us = np.array(times, dtype='datetime64[us]').astype(np.int64)
+        edges = np.linspace(times_us[0], times_us[-1], GRAPH_TIME_BUCKETS + 1)
+        bucket_arr = np.clip(np.searchsorted(edges, times_us, side='right') - 1,
+                             0, GRAPH_TIME_BUCKETS - 1)
+    
     # Plot scatter points for each worker
     for wid in unique_workers:
-        worker_times = [times[i] for i in range(len(times)) if worker_ids[i] == wid]
-        worker_speeds = [speeds[i] for i in range(len(speeds)) if worker_ids[i] == wid]
-        worker_sizes = [sizes[i] for i in range(len(sizes)) if worker_ids[i] == wid]
-        
-        # Size points by data size (normalized)
-        max_size = max(sizes) if sizes else 1
-        point_sizes = [30 + (s / max_size) * 100 for s in worker_sizes]
-        
-        ax.scatter(worker_times, worker_speeds, 
-                   c=[color_map[wid]], s=point_sizes, alpha=0.6,
+        mask = wid_arr == wid
+        if binned:
+            w_times, w_speeds, w_sizes = _bucket_means(
+                bucket_arr[mask],
+                [times_us[mask], speeds_arr[mask], point_sizes_arr[mask]],
+                GRAPH_TIME_BUCKETS,
+            )
+            w_times = w_times.astype(np.int64).astype('datetime64[us]')
+        else:
+            w_times, w_speeds, w_sizes = times_arr[mask], speeds_arr[mask], point_sizes_arr[mask]
+        ax.scatter(w_times, w_speeds, 
+                   c=[color_map[wid]], s=w_sizes, alpha=0.6,
                    label=f'Worker {wid}', edgecolors='white', linewidth=0.5)
     
     # Plot rolling average line
@@ -365,7 +443,7 @@ def generate_per_worker_speed_graph(workers: dict, health_kills: list = None, ou
     Generate a subplot grid showing each worker's speed over time individually.
     Shows vertical lines where workers were killed by health checks.
     """
-    if not HAS_MATPLOTLIB:
+    if not _load_plotting():
         print("\n⚠️  Skipping per-worker graph (matplotlib not available).")
         return
     
@@ -473,8 +551,8 @@ def print_header(title: str, char: str = "="):
     print(f"{char * 60}")
 
 
-def analyze_and_report(data: dict):
-    """Generate comprehensive analysis report."""
+def print_report(data: dict):
+    """Print the text sections of the analysis report."""
     workers = data['workers']
     balancer_splits = data['balancer_splits']
     download_info = data['download_info']
@@ -504,20 +582,25 @@ def analyze_and_report(data: dict):
     # ==========================================================================
     print_header("🚀 WORKER PERFORMANCE BREAKDOWN")
     
-    # Calculate global averages for comparison
-    all_tasks = [t for w in workers.values() for t in w.tasks]
+    # Calculate global averages for comparison from the per-worker running
+    # totals, without materializing a flat list of every task
+    total_bytes = 0
+    total_time = 0.0
+    n_tasks = 0
+    for w in workers.values():
+        total_bytes += w.total_bytes
+        total_time += w.total_work_time
+        n_tasks += len(w.tasks)
+    
     global_avg_speed = 0.0
-    if all_tasks:
-        total_bytes = sum(t.length for t in all_tasks)
-        total_time = sum(t.duration_seconds for t in all_tasks)
-        if total_time > 0:
-            global_avg_speed = (total_bytes / MB) / total_time
+    if n_tasks and total_time > 0:
+        global_avg_speed = (total_bytes / MB) / total_time
     
-    global_avg_task_duration = sum(t.duration_seconds for t in all_tasks) / len(all_tasks) if all_tasks else 0
+    global_avg_task_duration = total_time / n_tasks if n_tasks else 0
     
     print(f"\n  Global Avg Speed: {global_avg_speed:.2f} MB/s")
     print(f"  Global Avg Task:  {global_avg_task_duration:.2f}s")
-    print(f"  Total Tasks:      {len(all_tasks)}")
+    print(f"  Total Tasks:      {n_tasks}")
     
     # Table header
     print(f"\n  {'ID':>3} │ {'Tasks':>5} │ {'Avg Speed':>10} │ {'Util %':>7} │ {'Idle':>8} │ {'Status':<15}")
@@ -594,9 +677,8 @@ def analyze_and_report(data: dict):
         print(f"\n  {'Worker':>6} │ {'Offset':>12} │ {'Size':>10} │ {'Duration':>10} │ {'Speed':>10}")
         print(f"  {'─'*6}─┼─{'─'*12}─┼─{'─'*10}─┼─{'─'*10}─┼─{'─'*10}")
         
-        # Sort by duration descending
-        slow_tasks.sort(key=lambda x: x[1].duration_seconds, reverse=True)
-        for wid, t in slow_tasks[:10]:  # Top 10 slowest
+        # Top 10 slowest, by duration descending
+        for wid, t in heapq.nlargest(10, slow_tasks, key=lambda x: x[1].duration_seconds):
             offset_mb = t.offset / MB
             size_mb = t.length / MB
             print(f"  {wid:>6} │ {offset_mb:>10.2f}MB │ {size_mb:>8.2f}MB │ {t.duration_seconds:>8.2f}s │ {t.speed_mbps:>8.2f}MB/s")
@@ -625,10 +707,10 @@ def analyze_and_report(data: dict):
         print(f"  │ Wall Time: {w.wall_time:.2f}s  Work Time: {w.total_work_time:.2f}s  Idle: {w.idle_time:.2f}s")
         
         # Top N slowest tasks for this worker
-        sorted_tasks = sorted(w.tasks, key=lambda t: t.duration_seconds, reverse=True)
+        top_slow = heapq.nlargest(TOP_N_SLOW_TASKS, w.tasks, key=lambda t: t.duration_seconds)
         print(f"  │")
         print(f"  │ Top {TOP_N_SLOW_TASKS} Slowest Tasks:")
-        for i, t in enumerate(sorted_tasks[:TOP_N_SLOW_TASKS], 1):
+        for i, t in enumerate(top_slow, 1):
             print(f"  │   {i}. {t.duration_seconds:.2f}s @ {t.speed_mbps:.2f}MB/s (offset {t.offset / MB:.2f}MB)")
         
         print(f"  └{'─' * 50}")
@@ -705,13 +787,28 @@ def analyze_and_report(data: dict):
             print(f"\n  {i}. {rec}")
     else:
         print("\n  ✅ No major optimization issues detected. Download looks healthy!")
+
+
+def analyze_and_report(data: dict, make_graph: bool = True):
+    """Generate comprehensive analysis report."""
+    # The report is hundreds of short lines; collect them in memory and
+    # emit a single write rather than paying for each print() separately.
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        print_report(data)
+    sys.stdout.write(buf.getvalue())
+    
+    workers = data['workers']
+    if not workers:
+        return
     
     # ==========================================================================
     # GENERATE SPEED GRAPHS
     # ==========================================================================
-    print_header("📊 SPEED GRAPH GENERATION")
-    generate_speed_graph(workers)
-    generate_per_worker_speed_graph(workers, health_kills=data.get('health_kills', []))
+    if make_graph:
+        print_header("📊 SPEED GRAPH GENERATION")
+        generate_speed_graph(workers)
+        generate_per_worker_speed_graph(workers, health_kills=data.get('health_kills', []))
     
     print("\n" + "=" * 60)
 
@@ -720,12 +817,18 @@ def analyze_and_report(data: dict):
 # MAIN
 # ==============================================================================
 def main():
-    filename = sys.argv[1] if len(sys.argv) > 1 else "debug.log"
+    import argparse
+    parser = argparse.ArgumentParser(description="Surge Download Log Analyzer")
+    parser.add_argument("filename", nargs="?", default="debug.log", help="Debug log to analyze (default: debug.log)")
+    parser.add_argument("--no-graph", action="store_true", help="Skip speed graph generation (text report only)")
+    args = parser.parse_args()
+    
+    filename = args.filename
     print(f"\n🔍 Surge Log Analyzer - Verbose Mode")
     print(f"   Analyzing: {filename}")
     
     data = parse_log_file(filename)
-    analyze_and_report(data)
+    analyze_and_report(data, make_graph=not args.no_graph)
 
 
 if __name__ == "__main__":
@@ -6,17 +6,21 @@ Benchmark script to compare Surge against other download tools:
 - curl
 """
 
+import json
 import os
 import platform
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import random
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 # =============================================================================
 # PLATFORM DETECTION
@@ -34,6 +38,9 @@ TEST_URL = "https://sin-speed.hetzner.com/1GB.bin"
 
 MB = 1024 * 1024
 
+# Surge's completion line: "Complete: 1.0 GB in 5.2s (196.34 MB/s)" OR "... in 500ms ..."
+_SURGE_TIME_RE = re.compile(r"in ([\d\.]+)(m?s)")
+
 
 # =============================================================================
 # DATA CLASSES
@@ -58,21 +65,77 @@ class BenchmarkResult:
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
-def run_command(cmd: list[str], cwd: Optional[str] = None, timeout: int = 600) -> tuple[bool, str]:
-    """Run a command and return (success, output)."""
+TAIL_BYTES = 8192  # Output kept by run_command(capture="tail")
+
+
+def cooldown_seconds(elapsed: float) -> float:
+    """Pause after a run: 10% of its duration, clamped to 0.5-5s."""
+    return max(0.5, min(5.0, elapsed * 0.1))
+
+
+def _run_tail(cmd: list[str], cwd: Optional[str], timeout: int, stderr_only: bool = False) -> tuple[int, str]:
+    """Run a command keeping only the last TAIL_BYTES of stdout+stderr.
+    
+    With stderr_only, stdout goes straight to DEVNULL and only stderr is kept.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL if stderr_only else subprocess.PIPE,
+        stderr=subprocess.PIPE if stderr_only else subprocess.STDOUT,
+    )
+    stream = proc.stderr if stderr_only else proc.stdout
+    tail = bytearray()
+    
+    def drain():
+        for chunk in iter(lambda: stream.read(65536), b""):
+            tail.extend(chunk)
+            if len(tail) > TAIL_BYTES:
+                del tail[:-TAIL_BYTES]
+    
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
     try:
-        # On Windows, use shell=True to find executables in PATH
-        # and handle .exe extensions properly
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        reader.join()
+        stream.close()
+    return proc.returncode, tail.decode("utf-8", errors="replace")
+
+
+def run_command(
+    cmd: list[str],
+    cwd: Optional[str] = None,
+    timeout: int = 600,
+    capture: Literal["full", "tail", "stderr"] = "full",
+) -> tuple[bool, str]:
+    """Run a command and return (success, output).
+    
+    capture="tail" keeps only the end of the output in constant memory,
+    capture="stderr" discards stdout and keeps only the end of stderr.
+    """
+    # Resolve the executable ourselves (once per name) rather than spawning
+    # a shell for PATH/.exe lookup on Windows
+    cmd = [resolve_executable(cmd[0]), *cmd[1:]]
+    try:
+        if capture in ("tail", "stderr"):
+            returncode, output = _run_tail(cmd, cwd, timeout, stderr_only=capture == "stderr")
+            return returncode == 0, output
+        
+        # Merge stderr into stdout at the pipe so there is a single bytes
+        # buffer, decoded once instead of two decodes plus a concat
         result = subprocess.run(
             cmd,
             cwd=cwd,
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             timeout=timeout,
-            shell=IS_WINDOWS,  # Needed for Windows PATH resolution
         )
-        output = result.stdout + result.stderr
-        return result.returncode == 0, output
+        return result.returncode == 0, result.stdout.decode("utf-8", errors="replace")
     except subprocess.TimeoutExpired:
         return False, "Command timed out"
     except FileNotFoundError as e:
@@ -81,25 +144,30 @@ def run_command(cmd: list[str], cwd: Optional[str] = None, timeout: int = 600) -
         return False, str(e)
 
 
+# shutil.which() answers, so repeat checks are a single dict lookup
+_WHICH_CACHE: dict[str, Optional[str]] = {}
+
+
 def which(cmd: str) -> Optional[str]:
     """Return the path to a command, or None if not found."""
-    return shutil.which(cmd)
+    try:
+        return _WHICH_CACHE[cmd]
+    except KeyError:
+        path = _WHICH_CACHE[cmd] = shutil.which(cmd)
+        return path
 
 
-def get_file_size(path: Path) -> int:
-    """Get the size of a file in bytes."""
-    if path.exists():
-        return path.stat().st_size
-    return 0
+def resolve_executable(name: str) -> str:
+    """Return the absolute path for an executable, or name itself if not found."""
+    return which(name) or name
 
 
-def cleanup_file(path: Path):
-    """Remove a file if it exists."""
+def get_file_size(path: Path) -> int:
+    """Get the size of a file in bytes."""
     try:
-        if path.exists():
-            path.unlink()
-    except Exception:
-        pass
+        return path.stat().st_size
+    except OSError:
+        return 0
 
 
 # =============================================================================
@@ -158,14 +226,12 @@ def benchmark_surge(executable: Path, url: str, output_dir: Path, label: str = "
     success, output = run_command([
         str(executable), "get", url,
         "--output", str(output_dir),  # Download directory
-    ], timeout=600)
+    ], timeout=600, capture="tail")
     elapsed = time.perf_counter() - start
     
     # Try to parse the actual download time from Surge output (excluding probing)
-    # Output format: "Complete: 1.0 GB in 5.2s (196.34 MB/s)" OR "... in 500ms ..."
-    import re
     actual_time = elapsed
-    match = re.search(r"in ([\d\.]+)(m?s)", output)
+    match = _SURGE_TIME_RE.search(output)
     if match:
         try:
             val = float(match.group(1))
@@ -176,13 +242,22 @@ def benchmark_surge(executable: Path, url: str, output_dir: Path, label: str = "
         except ValueError:
             pass
 
-    # Find downloaded file (surge uses original filename)
-    downloaded_files = list(output_dir.glob("*.bin")) + list(output_dir.glob("*MB*")) + list(output_dir.glob("*.zip"))
+    # Find downloaded file (surge uses original filename) in a single
+    # directory pass; main() removes the whole dir after the iteration
     file_size = 0
-    for f in downloaded_files:
-        if f.is_file() and "surge" not in f.name:
-            file_size = max(file_size, get_file_size(f))
-            cleanup_file(f)
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if "surge" in name:
+                continue
+            if not (name.endswith(".bin") or "MB" in name or name.endswith(".zip")):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                file_size = max(file_size, entry.stat().st_size)
+            except OSError:
+                continue
     
     if not success:
         return BenchmarkResult(label, False, actual_time, file_size, output[:200])
@@ -193,7 +268,6 @@ def benchmark_surge(executable: Path, url: str, output_dir: Path, label: str = "
 def benchmark_aria2(url: str, output_dir: Path) -> BenchmarkResult:
     """Benchmark aria2c downloader."""
     output_file = output_dir / "aria2_download"
-    cleanup_file(output_file)
     
     if not which("aria2c"):
         return BenchmarkResult("aria2c", False, 0, 0, "aria2c not installed")
@@ -209,11 +283,10 @@ def benchmark_aria2(url: str, output_dir: Path) -> BenchmarkResult:
     ]
     
     start = time.perf_counter()
-    success, output = run_command(cmd, timeout=600)
+    success, output = run_command(cmd, timeout=600, capture="tail")
     elapsed = time.perf_counter() - start
     
     file_size = get_file_size(output_file)
-    cleanup_file(output_file)
     
     if not success:
         return BenchmarkResult("aria2c", False, elapsed, file_size, output[:200])
@@ -224,7 +297,6 @@ def benchmark_aria2(url: str, output_dir: Path) -> BenchmarkResult:
 def benchmark_wget(url: str, output_dir: Path) -> BenchmarkResult:
     """Benchmark wget downloader."""
     output_file = output_dir / "wget_download"
-    cleanup_file(output_file)
     
     wget_bin = which("wget")
     if not wget_bin:
@@ -232,12 +304,11 @@ def benchmark_wget(url: str, output_dir: Path) -> BenchmarkResult:
     
     start = time.perf_counter()
     success, output = run_command([
-        wget_bin, "-q", "-O", str(output_file), url
-    ], timeout=600)
+        wget_bin, "-nv", "-O", str(output_file), url
+    ], timeout=600, capture="stderr")
     elapsed = time.perf_counter() - start
     
     file_size = get_file_size(output_file)
-    cleanup_file(output_file)
     
     if not success:
         return BenchmarkResult("wget", False, elapsed, file_size, output[:200])
@@ -248,7 +319,6 @@ def benchmark_wget(url: str, output_dir: Path) -> BenchmarkResult:
 def benchmark_curl(url: str, output_dir: Path) -> BenchmarkResult:
     """Benchmark curl downloader."""
     output_file = output_dir / "curl_download"
-    cleanup_file(output_file)
     
     curl_bin = which("curl")
     if not curl_bin:
@@ -256,12 +326,11 @@ def benchmark_curl(url: str, output_dir: Path) -> BenchmarkResult:
     
     start = time.perf_counter()
     success, output = run_command([
-        curl_bin, "-s", "-L", "-o", str(output_file), url
-    ], timeout=600)
+        curl_bin, "-sS", "-L", "-o", str(output_file), url
+    ], timeout=600, capture="stderr")
     elapsed = time.perf_counter() - start
     
     file_size = get_file_size(output_file)
-    cleanup_file(output_file)
     
     if not success:
         return BenchmarkResult("curl", False, elapsed, file_size, output[:200])
@@ -309,6 +378,13 @@ def print_results(results: list[BenchmarkResult]):
     print_histogram(results)
 
 
+def write_json_report(results: list[BenchmarkResult], path: Path):
+    """Write benchmark results as JSON for machine consumers."""
+    report = {"results": [{**asdict(r), "speed_mbps": r.speed_mbps} for r in results]}
+    path.write_text(json.dumps(report, indent=2))
+    print(f"  JSON report written to: {path}")
+
+
 def print_histogram(results: list[BenchmarkResult]):
     """Print a text-based histogram of download speeds."""
     successful = [r for r in results if r.success and r.speed_mbps > 0]
@@ -375,6 +451,8 @@ def main():
     
     # Feature flags
     parser.add_argument("--speedtest", action="store_true", help="Run network speedtest")
+    parser.add_argument("--parallel", action="store_true", help="Run all tools of an iteration concurrently (skews results; serial is default)")
+    parser.add_argument("--json-out", type=Path, help="Also write the final results as JSON to this path")
 
     args = parser.parse_args()
     
@@ -403,6 +481,8 @@ def main():
         print("\nSETUP")
         print("-" * 40)
         
+        run_all = not specific_service_requested
+
         # Check speedtest if requested
         if args.speedtest:
             if which("speedtest-cli"):
@@ -410,8 +490,6 @@ def main():
             else:
                 print("  [X] speedtest-cli not found (install speedtest-cli)")
 
-        run_all = not specific_service_requested
-
         # Initialize all to False
         surge_ok, aria2_ok, wget_ok, curl_ok = False, False, False, False
         surge_exec = None
@@ -456,28 +534,35 @@ def main():
         if run_all or args.curl:
             curl_ok = check_curl()
         
+        tool_dirs: dict[str, Path] = {}
+        
+        def tool_dir(name: str) -> Path:
+            """Download dir for a tool, recreated at the start of every iteration."""
+            path = tool_dirs[name] = download_dir / name.replace(" ", "_")
+            return path
+        
         # Define benchmarks to run
         tasks = []
         
         # Surge Main
         if surge_ok:
-            tasks.append({"name": "surge (current)", "func": benchmark_surge, "args": (surge_exec, test_url, download_dir, "surge (current)")})
+            tasks.append({"name": "surge (current)", "func": benchmark_surge, "args": (surge_exec, test_url, tool_dir("surge (current)"), "surge (current)")})
         
         # Surge Baseline
         if surge_baseline_exec:
-             tasks.append({"name": "surge (baseline)", "func": benchmark_surge, "args": (surge_baseline_exec, test_url, download_dir, "surge (baseline)")})
+             tasks.append({"name": "surge (baseline)", "func": benchmark_surge, "args": (surge_baseline_exec, test_url, tool_dir("surge (baseline)"), "surge (baseline)")})
         
         # aria2c
         if aria2_ok and (run_all or args.aria2):
-            tasks.append({"name": "aria2c", "func": benchmark_aria2, "args": (test_url, download_dir)})
+            tasks.append({"name": "aria2c", "func": benchmark_aria2, "args": (test_url, tool_dir("aria2c"))})
         
         # wget
         if wget_ok and (run_all or args.wget):
-            tasks.append({"name": "wget", "func": benchmark_wget, "args": (test_url, download_dir)})
+            tasks.append({"name": "wget", "func": benchmark_wget, "args": (test_url, tool_dir("wget"))})
         
         # curl
         if curl_ok and (run_all or args.curl):
-            tasks.append({"name": "curl", "func": benchmark_curl, "args": (test_url, download_dir)})
+            tasks.append({"name": "curl", "func": benchmark_curl, "args": (test_url, tool_dir("curl"))})
 
         # Initialize results storage
         # Map: tool_name -> list of BenchmarkResult
@@ -499,16 +584,49 @@ def main():
                 print("  " + "\n  ".join(st_result.splitlines()))
             print("-" * 40)
 
+        exec_order = "Parallel" if args.parallel else "Interlaced"
         print(f"  Downloading: {test_url}")
-        print(f"  Exec Order:  Interlaced ({len(tasks)} tools x {num_iterations} runs)\n")
+        print(f"  Exec Order:  {exec_order} ({len(tasks)} tools x {num_iterations} runs)\n")
+        
+        # One index permutation, reshuffled in place every iteration
+        order = list(range(len(tasks)))
         
         for i in range(num_iterations):
             print(f"\n  [ Iteration {i+1}/{num_iterations} ]")
             
-            iteration_tasks = tasks.copy()
-            random.shuffle(iteration_tasks)
+            random.shuffle(order)
+            
+            # Every tool downloads into its own fresh dir, removed as a whole
+            # once the run is done instead of unlinking files one by one
+            for path in tool_dirs.values():
+                path.mkdir(parents=True, exist_ok=True)
+
+            if args.parallel:
+                # All tools download at once; the subprocess waits overlap
+                longest = 0.0
+                with ThreadPoolExecutor(max_workers=len(order)) as pool:
+                    futures = {pool.submit(tasks[idx]["func"], *tasks[idx]["args"]): tasks[idx]["name"] for idx in order}
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        res = future.result()
+                        raw_results[name].append(res)
+                        longest = max(longest, res.elapsed_seconds)
+                        
+                        if res.success:
+                            print(f"    {name}: {res.elapsed_seconds:.2f}s")
+                        else:
+                            print(f"    {name}: Failed")
+                
+                # Concurrent runs all finish together; drop every dir at once
+                shutil.rmtree(download_dir, ignore_errors=True)
+                
+                # Nothing left to cool down for after the last iteration
+                if i < num_iterations - 1:
+                    time.sleep(cooldown_seconds(longest))
+                continue
 
-            for task in iteration_tasks:
+            for pos, idx in enumerate(order):
+                task = tasks[idx]
                 name = task["name"]
                 func = task["func"]
                 task_args = task["args"]
@@ -523,8 +641,15 @@ def main():
                 else:
                     print(" Failed")
                 
-                # Increase sleep to allow SSD buffer flush and server rate-limit reset
-                time.sleep(5)
+                # Free the download before the next tool runs, so at most one
+                # file is on disk and the cooldown flushes only this one
+                shutil.rmtree(tool_dirs[name], ignore_errors=True)
+                
+                # Sleep to allow SSD buffer flush and server rate-limit reset,
+                # scaled to how long the run took so short downloads don't
+                # wait the full 5s (skipped after the final run)
+                if i < num_iterations - 1 or pos < len(order) - 1:
+                    time.sleep(cooldown_seconds(res.elapsed_seconds))
 
         # Aggregate results
         final_results: list[BenchmarkResult] = []
@@ -576,6 +701,8 @@ def main():
 
         # Print results
         print_results(final_results)
+        if args.json_out:
+            write_json_report(final_results, args.json_out)
 
         
     finally:
@@ -215,6 +215,9 @@ func (d *ConcurrentDownloader) Download(ctx context.Context, rawurl, destPath st
 		if err := outFile.Truncate(fileSize); err != nil {
 			return fmt.Errorf("failed to preallocate file: %w", err)
 		}
+		if err := preallocateFile(outFile, fileSize); err != nil {
+			utils.Debug("Block preallocation skipped: %v", err)
+		}
 		tasks = createTasks(fileSize, chunkSize)
 		// Robustness: ensure state counter starts at 0 for fresh download
 		if d.State != nil {
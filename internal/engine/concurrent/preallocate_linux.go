@@ -0,0 +1,24 @@
+//go:build linux
+
+package concurrent
+
+import (
+	"errors"
+	"os"
+	"syscall"
+)
+
+// preallocateFile reserves disk blocks for the whole file up front.
+// Truncate only sets the size and leaves a sparse file, so every chunk write
+// would otherwise allocate extents as it lands.
+func preallocateFile(f *os.File, size int64) error {
+	if size <= 0 {
+		return nil
+	}
+	err := syscall.Fallocate(int(f.Fd()), 0, 0, size)
+	if errors.Is(err, syscall.EOPNOTSUPP) || errors.Is(err, syscall.ENOSYS) {
+		// Filesystem cannot reserve blocks; the sparse file still works
+		return nil
+	}
+	return err
+}
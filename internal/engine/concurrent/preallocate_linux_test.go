@@ -0,0 +1,54 @@
+//go:build linux
+
+package concurrent
+
+import (
+	"errors"
+	"os"
+	"path/filepath"
+	"syscall"
+	"testing"
+)
+
+func TestPreallocateFile_ReservesBlocks(t *testing.T) {
+	dir := t.TempDir()
+
+	// Probe first: preallocateFile swallows EOPNOTSUPP, which would make a
+	// sparse file look like a failure below
+	probe, err := os.Create(filepath.Join(dir, "probe"))
+	if err != nil {
+		t.Fatalf("create probe: %v", err)
+	}
+	err = syscall.Fallocate(int(probe.Fd()), 0, 0, 4096)
+	probe.Close()
+	if errors.Is(err, syscall.EOPNOTSUPP) || errors.Is(err, syscall.ENOSYS) {
+		t.Skipf("fallocate not supported on %s: %v", dir, err)
+	}
+
+	f, err := os.Create(filepath.Join(dir, "prealloc.surge"))
+	if err != nil {
+		t.Fatalf("create: %v", err)
+	}
+	defer f.Close()
+
+	const size = 1 << 20
+	if err := f.Truncate(size); err != nil {
+		t.Fatalf("truncate: %v", err)
+	}
+	if err := preallocateFile(f, size); err != nil {
+		t.Fatalf("preallocateFile: %v", err)
+	}
+
+	info, err := f.Stat()
+	if err != nil {
+		t.Fatalf("stat: %v", err)
+	}
+	st, ok := info.Sys().(*syscall.Stat_t)
+	if !ok {
+		t.Fatalf("unexpected stat type %T", info.Sys())
+	}
+	// Stat_t.Blocks counts 512-byte units regardless of filesystem block size
+	if got := st.Blocks * 512; got < size {
+		t.Errorf("allocated = %d bytes, want >= %d", got, size)
+	}
+}
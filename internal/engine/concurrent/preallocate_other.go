@@ -0,0 +1,11 @@
+//go:build !linux
+
+package concurrent
+
+import "os"
+
+// preallocateFile is a no-op where fallocate is unavailable; the file is
+// already sized by Truncate.
+func preallocateFile(f *os.File, size int64) error {
+	return nil
+}
@@ -0,0 +1,44 @@
+package concurrent
+
+import (
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestPreallocateFile_KeepsSize(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "prealloc.surge")
+	f, err := os.Create(path)
+	if err != nil {
+		t.Fatalf("create: %v", err)
+	}
+	defer f.Close()
+
+	const size = 1 << 20
+	if err := f.Truncate(size); err != nil {
+		t.Fatalf("truncate: %v", err)
+	}
+	if err := preallocateFile(f, size); err != nil {
+		t.Fatalf("preallocateFile: %v", err)
+	}
+
+	info, err := f.Stat()
+	if err != nil {
+		t.Fatalf("stat: %v", err)
+	}
+	if info.Size() != size {
+		t.Errorf("size = %d, want %d", info.Size(), size)
+	}
+}
+
+func TestPreallocateFile_ZeroSize(t *testing.T) {
+	f, err := os.Create(filepath.Join(t.TempDir(), "empty.surge"))
+	if err != nil {
+		t.Fatalf("create: %v", err)
+	}
+	defer f.Close()
+
+	if err := preallocateFile(f, 0); err != nil {
+		t.Errorf("preallocateFile(0) = %v, want nil", err)
+	}
+}